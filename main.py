@@ -2,6 +2,7 @@
 import yaml
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Tuple
 import numpy as np
 import matplotlib.pyplot as plt
@@ -20,6 +21,11 @@ def main():
     # 加载配置
     config = load_config('config.yaml')
     
+    # 无界面运行时使用Agg后端，跳过GUI绘制开销
+    headless = config['visualization'].get('headless', False)
+    if headless:
+        plt.switch_backend('Agg')
+    
     # 设置环境参数
     env_config = config['environment']
     bounds = (
@@ -39,7 +45,11 @@ def main():
         bounds=bounds,
         obstacles=obstacles,
         step_size=config['rrt_params']['step_size'],
-        max_iterations=config['rrt_params']['max_iterations']
+        max_iterations=config['rrt_params']['max_iterations'],
+        batch_size=config['rrt_params'].get('batch_size', 50),
+        n_candidates=config['rrt_params'].get('n_candidates', 16),
+        vlm_every=config['rrt_params'].get('vlm_every', 20),
+        stall_iterations=config['rrt_params'].get('stall_iterations', 200)
     )
     
     multimodal = MultiModalInteraction(config['model_params'])
@@ -47,55 +57,70 @@ def main():
     prompt_manager = PromptTemplate()
     
     # 设置可视化环境
-    visualizer.setup_plot()
+    visualizer.setup_plot(show=not headless)
     visualizer.draw_obstacles(obstacles)
     visualizer.draw_start_goal(Node(*start), Node(*goal))
     
     # 定义反馈函数
+    last_query = {'node': None, 'count': 0}
+    draw_every = config['visualization'].get('draw_every', 10)
+    
     def feedback_function(current_node: Node, goal_node: Node, 
-                        obstacles: List[Tuple[float, float, float]]):
-        # 获取多模态模型的建议
-        sectors_data = multimodal.get_feedback(
+                        obstacles: List[Tuple[float, float, float]],
+                        stalled: bool = False):
+        # 每draw_every次查询可视化一次上一次查询得到的扇区
+        if (config['visualization']['show_sectors'] and last_query['node'] is not None
+                and last_query['count'] % draw_every == 0):
+            visualizer.draw_sectors(last_query['node'], rrt_planner.current_sectors)
+            visualizer.update()  # 实时更新显示
+        last_query['node'] = current_node
+        last_query['count'] += 1
+        
+        # 在后台获取多模态模型的建议，规划器在结果返回前继续扩展
+        return multimodal.get_feedback_async(
             current_node=current_node,
             goal_node=goal_node,
-            nodes=rrt_planner.nodes,  # 传入所有已探索的节点
+            node_arrays=rrt_planner.node_arrays(),  # 传入所有已探索的节点
             obstacles=obstacles,
-            bounds=bounds
+            bounds=bounds,
+            use_cache=not stalled  # 停滞时缓存的建议正是导致停滞的建议
         )
-        
-        # 将返回的数据转换为SectorConfig对象
-        sectors = multimodal._convert_to_sector_config(sectors_data)
-        
-        # 可视化当前状态
-        if config['visualization']['show_sectors']:
-            visualizer.draw_sectors(current_node, sectors)
-            visualizer.update()  # 实时更新显示
-        
-        return sectors
     
     # 执行路径规划
     start_time = time.time()
     path = rrt_planner.plan(feedback_function)
     end_time = time.time()
     
+    # 在后台线程保存结果图像，避免阻塞主线程
+    executor = ThreadPoolExecutor(max_workers=1)
+    save_future = None
+    
     if path:
         print(f"Path found in {end_time - start_time:.2f} seconds!")
         # 绘制最终结果
-        visualizer.draw_nodes(rrt_planner.nodes)
+        visualizer.draw_nodes(*rrt_planner.node_arrays())
         visualizer.draw_path(path)
         
         # 保存结果
         if not os.path.exists(config['visualization']['save_path']):
             os.makedirs(config['visualization']['save_path'])
-        visualizer.save(
+        save_future = executor.submit(
+            visualizer.save,
             os.path.join(
                 config['visualization']['save_path'],
                 f'result_{time.strftime("%Y%m%d_%H%M%S")}.png'
             )
         )
-        plt.show()
     else:
         print("No path found!")
+    
+    # 等待仍在进行的模型请求与图像保存完成
+    multimodal.close()
+    executor.shutdown(wait=True)
+    if save_future is not None:
+        save_future.result()  # 重新抛出保存过程中的异常
+    if path and not headless:
+        plt.show()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
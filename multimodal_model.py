@@ -1,13 +1,32 @@
 # multimodal_model.py
 import base64
 import io
+import json
+import re
+import threading
 import requests
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 import numpy as np
-import matplotlib.pyplot as plt
-from typing import List, Tuple, Dict
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+from matplotlib.patches import Circle
+from typing import List, Tuple, Dict, Optional
 from dataclasses import dataclass
 from PIL import Image
 
+from rrt_planner import SectorConfig
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # 未安装orjson时使用标准库
+    _json_loads = json.loads
+
+# 从模型回复中提取JSON对象（回复中可能包含说明文字或代码块标记）
+_JSON_RE = re.compile(r'\{.*\}', re.DOTALL)
+
 @dataclass
 class ModelFeedback:
     sectors: List[Dict]
@@ -21,54 +40,8 @@ class MultiModalInteraction:
         self.api_base = "https://api.openai.com/v1/chat/completions"
         self.history = []
         
-    def create_scene_image(self, current_node, goal_node, nodes, obstacles, bounds) -> Image:
-        """创建当前场景的图像"""
-        # 创建新的图像
-        fig, ax = plt.subplots(figsize=(8, 8))
-        ax.set_xlim(bounds[0], bounds[2])
-        ax.set_ylim(bounds[1], bounds[3])
-        
-        # 绘制所有节点和连接
-        for node in nodes[1:]:
-            if node.parent_id is not None:
-                parent = nodes[node.parent_id]
-                ax.plot([parent.x, node.x], [parent.y, node.y], 
-                       'g-', alpha=0.5, linewidth=0.5)
-        
-        # 绘制障碍物
-        for ox, oy, r in obstacles:
-            circle = plt.Circle((ox, oy), r, color='red', alpha=0.3)
-            ax.add_patch(circle)
-        
-        # 绘制起点和终点
-        ax.plot(nodes[0].x, nodes[0].y, 'go', markersize=10, label='Start')
-        ax.plot(goal_node.x, goal_node.y, 'ro', markersize=10, label='Goal')
-        
-        # 突出显示当前节点
-        ax.plot(current_node.x, current_node.y, 'bo', markersize=8, label='Current')
-        
-        # 添加网格和图例
-        ax.grid(True)
-        ax.legend()
-        ax.set_aspect('equal')
-        
-        # 将图像转换为PIL Image
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
-        buf.seek(0)
-        plt.close(fig)
-        
-        return Image.open(buf)
-    
-    def encode_image(self, image: Image) -> str:
-        """将PIL Image转换为base64编码"""
-        buffered = io.BytesIO()
-        image.save(buffered, format="PNG")
-        return base64.b64encode(buffered.getvalue()).decode('utf-8')
-    
-    def create_prompt(self, current_node, goal_node) -> str:
-        """创建用于查询多模态模型的prompt"""
-        return f"""
+        # prompt内容与节点无关，只构建一次
+        self._prompt = """
         你现在是一个路径规划专家，我向你展示了一个2D环境中的路径规划场景。
         图中:
         - 绿点表示起点
@@ -98,14 +71,241 @@ class MultiModalInteraction:
             "confidence": float             // 建议置信度(0-1)
         }
         """
+        
+        self._state_template = """
+        当前状态（图像只显示当前位置附近的区域，目标可能不在图中）:
+        - 当前位置: ({current_x:.2f}, {current_y:.2f})
+        - 目标位置: ({goal_x:.2f}, {goal_y:.2f})
+        - 目标距离: {distance:.2f}
+        - 目标方向: {angle:.1f}度（0度为正x轴）
+        """
+        
+        # 复用同一连接(keep-alive)，避免每次请求重新握手
+        self._session = requests.Session()
+        self._executor = None
+        
+        # 持久化的场景图像，逐次增量绘制新增的树边；
+        # 直接使用Agg画布，不经过pyplot的全局状态
+        self._base_fig = Figure(figsize=(4, 4), dpi=96)
+        self._canvas = FigureCanvasAgg(self._base_fig)
+        self._base_ax = self._base_fig.add_subplot(111)
+        self._current_marker = None
+        self._last_drawn_count = 0
+        self._scene_obstacles = None
+        self._scene_key = None
+        self.image_cache_size = model_config.get('image_cache_size', 32)
+        
+        # 图像预算：视觉输入按token计费，只发送当前节点附近的小尺寸低精度图像
+        self.view_radius = model_config.get('view_radius', 5.0)  # 裁剪窗口半宽
+        self.image_max_size = model_config.get('image_max_size', 512)  # 最大边长(像素)
+        self.image_detail = model_config.get('image_detail', 'low')
+        self.image_quality = model_config.get('image_quality', 80)  # JPEG质量
+        self._image_cache: OrderedDict = OrderedDict()
+        
+        # 按量化后的局部状态缓存模型建议，相同局部情况不再重复请求
+        self.angle_step = model_config.get('angle_step', 15.0)  # 角度量化步长(度)
+        self.feedback_cache_size = model_config.get('feedback_cache_size', 128)
+        self._feedback_cache: OrderedDict = OrderedDict()
+        self._feedback_lock = threading.Lock()
+        self._feedback_obstacles = None
+        self._obstacles_hash = None
+        
+    def _reset_scene(self, goal_node, node_arrays, obstacles, bounds):
+        """重建场景中的静态部分并清空图像缓存"""
+        ax = self._base_ax
+        ax.cla()
+        
+        # 绘制障碍物
+        for ox, oy, r in obstacles:
+            circle = Circle((ox, oy), r, color='red', alpha=0.3)
+            ax.add_patch(circle)
+        
+        # 绘制起点和终点
+        xs, ys, _ = node_arrays
+        ax.plot(xs[0], ys[0], 'go', markersize=10, label='Start')
+        ax.plot(goal_node.x, goal_node.y, 'ro', markersize=10, label='Goal')
+        
+        # 当前节点标记，每次调用时只更新其位置
+        self._current_marker, = ax.plot([], [], 'bo', markersize=8,
+                                        label='Current', zorder=3)
+        
+        # 添加网格和图例
+        ax.grid(True)
+        ax.legend()
+        ax.set_aspect('equal')
+        
+        self._scene_obstacles = obstacles
+        self._scene_key = (goal_node.x, goal_node.y, tuple(bounds))
+        self._last_drawn_count = 1
+        self._image_cache.clear()
+    
+    def _view_window(self, center: float, lo: float, hi: float) -> Tuple[float, float]:
+        """计算以center为中心、宽度固定且不超出边界的视野范围"""
+        width = 2 * self.view_radius
+        if width >= hi - lo:
+            return lo, hi
+        start = min(max(center - self.view_radius, lo), hi - width)
+        return start, start + width
+    
+    def create_scene_image(self, current_node, goal_node, node_arrays,
+                           obstacles, bounds) -> Image:
+        """创建当前场景的图像
+        
+        node_arrays为ImprovedRRT.node_arrays()返回的(xs, ys, parent_ids)。
+        """
+        xs, ys, parent_ids = node_arrays
+        n = len(xs)
+        # 障碍物或场景变化、或节点数回退（新一轮规划）时重建场景
+        if (obstacles is not self._scene_obstacles
+                or self._scene_key != (goal_node.x, goal_node.y, tuple(bounds))
+                or n < self._last_drawn_count):
+            self._reset_scene(goal_node, node_arrays, obstacles, bounds)
+        ax = self._base_ax
+        
+        # 只绘制上次调用之后新增的节点连接，合并为一个LineCollection
+        child = self._last_drawn_count + np.flatnonzero(
+            parent_ids[self._last_drawn_count:] >= 0)
+        if len(child):
+            parent = parent_ids[child]
+            segs = np.stack([np.column_stack([xs[parent], ys[parent]]),
+                             np.column_stack([xs[child], ys[child]])], axis=1)
+            ax.add_collection(
+                LineCollection(segs, colors='g', alpha=0.5, linewidth=0.5))
+        self._last_drawn_count = n
+        
+        # 突出显示当前节点，并把视野裁剪到其附近
+        self._current_marker.set_data([current_node.x], [current_node.y])
+        ax.set_xlim(*self._view_window(current_node.x, bounds[0], bounds[2]))
+        ax.set_ylim(*self._view_window(current_node.y, bounds[1], bounds[3]))
+        
+        # 直接读取Agg画布像素转换为PIL Image
+        canvas = self._canvas
+        canvas.draw()
+        return Image.frombuffer('RGBA', canvas.get_width_height(),
+                                canvas.buffer_rgba()).convert('RGB')
     
-    def get_feedback(self, current_node, goal_node, nodes, obstacles, bounds) -> List[Dict]:
-        """获取多模态模型的反馈"""
-        # 生成场景图像
+    def get_scene_base64(self, current_node, goal_node, node_arrays,
+                         obstacles, bounds) -> str:
+        """获取场景图像的base64编码，按节点数和当前位置缓存"""
+        key = (len(node_arrays[0]), round(current_node.x, 2), round(current_node.y, 2))
+        if obstacles is self._scene_obstacles and key in self._image_cache:
+            self._image_cache.move_to_end(key)
+            return self._image_cache[key]
+        
         scene_image = self.create_scene_image(
-            current_node, goal_node, nodes, obstacles, bounds)
+            current_node, goal_node, node_arrays, obstacles, bounds)
+        scene_image.thumbnail((self.image_max_size, self.image_max_size),
+                              Image.LANCZOS)
         base64_image = self.encode_image(scene_image)
+        self._image_cache[key] = base64_image
+        if len(self._image_cache) > self.image_cache_size:
+            self._image_cache.popitem(last=False)
+        return base64_image
+    
+    def encode_image(self, image: Image) -> str:
+        """将PIL Image转换为base64编码"""
+        buffered = io.BytesIO()
+        image.save(buffered, format="JPEG", quality=self.image_quality,
+                   optimize=False)
+        return base64.b64encode(buffered.getvalue()).decode('utf-8')
+    
+    def create_prompt(self, current_node, goal_node) -> str:
+        """创建用于查询多模态模型的prompt"""
+        # 图像只显示当前节点附近的区域，目标可能不在图中，因此在文字中给出目标方位
+        dx = goal_node.x - current_node.x
+        dy = goal_node.y - current_node.y
+        return self._prompt + self._state_template.format(
+            current_x=current_node.x, current_y=current_node.y,
+            goal_x=goal_node.x, goal_y=goal_node.y,
+            distance=np.hypot(dx, dy),
+            angle=np.degrees(np.arctan2(dy, dx)) % 360)
+    
+    def get_feedback(self, current_node, goal_node, node_arrays,
+                     obstacles, bounds, use_cache: bool = True) -> List[Dict]:
+        """获取多模态模型的反馈
+        
+        use_cache为False时跳过缓存重新请求（例如扩展停滞时），
+        新结果会覆盖同一状态下的缓存。
+        """
+        key = self._feedback_key(current_node, goal_node, obstacles)
+        cached = self._cached_feedback(key) if use_cache else None
+        if cached is not None:
+            return cached
+        
+        # 生成场景图像
+        base64_image = self.get_scene_base64(
+            current_node, goal_node, node_arrays, obstacles, bounds)
+        return self._request_feedback(current_node, goal_node, base64_image, key)
+    
+    def get_feedback_async(self, current_node, goal_node, node_arrays,
+                           obstacles, bounds, use_cache: bool = True) -> Future:
+        """异步获取多模态模型的反馈
+        
+        场景图像在调用线程中绘制，API请求在后台线程中执行，
+        返回的Future结果为转换后的SectorConfig列表。
+        """
+        key = self._feedback_key(current_node, goal_node, obstacles)
+        cached = self._cached_feedback(key) if use_cache else None
+        if cached is not None:
+            future = Future()
+            future.set_result(self._convert_to_sector_config(cached))
+            return future
         
+        base64_image = self.get_scene_base64(
+            current_node, goal_node, node_arrays, obstacles, bounds)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        return self._executor.submit(
+            lambda: self._convert_to_sector_config(
+                self._request_feedback(current_node, goal_node, base64_image, key)))
+    
+    def close(self):
+        """等待后台请求结束并关闭连接"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._session.close()
+    
+    def _feedback_key(self, current_node, goal_node, obstacles) -> tuple:
+        """由取整后的当前位置、目标相对位置和障碍物构成的局部状态键"""
+        if obstacles is not self._feedback_obstacles:
+            self._feedback_obstacles = obstacles
+            self._obstacles_hash = hash(tuple(tuple(o) for o in obstacles))
+        return (round(current_node.x), round(current_node.y),
+                round(goal_node.x - current_node.x),
+                round(goal_node.y - current_node.y),
+                self._obstacles_hash)
+    
+    def _cached_feedback(self, key: tuple):
+        """查询缓存的模型建议，未命中时返回None"""
+        with self._feedback_lock:
+            sectors = self._feedback_cache.get(key)
+            if sectors is not None:
+                self._feedback_cache.move_to_end(key)
+            return sectors
+    
+    def _quantize_sectors(self, sectors: List[Dict]) -> List[Dict]:
+        """将扇区角度量化到angle_step的整数倍，优先级归一化后保留一位小数
+
+        优先级先按最大值归一化再量化且至少为0.1，避免模型给出的小优先级
+        全部舍入为0后丢失相对权重。
+        """
+        step = self.angle_step
+        priorities = [float(sector['priority']) for sector in sectors]
+        top = max(priorities, default=0.0)
+        scale = 1.0 / top if top > 0 else 1.0
+        return [
+            {
+                "center_angle": round(float(sector['center_angle']) / step) * step,
+                "span_angle": max(round(float(sector['span_angle']) / step), 1) * step,
+                "priority": max(round(priority * scale, 1), 0.1)
+            }
+            for sector, priority in zip(sectors, priorities)
+        ]
+    
+    def _request_feedback(self, current_node, goal_node, base64_image: str,
+                          cache_key: Optional[tuple] = None) -> List[Dict]:
+        """发送API请求并解析扇区建议，成功时按cache_key缓存量化后的结果"""
         # 准备API请求
         headers = {
             "Content-Type": "application/json",
@@ -125,7 +325,8 @@ class MultiModalInteraction:
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/png;base64,{base64_image}"
+                                "url": f"data:image/jpeg;base64,{base64_image}",
+                                "detail": self.image_detail
                             }
                         }
                     ]
@@ -135,15 +336,24 @@ class MultiModalInteraction:
         }
         
         try:
-            response = requests.post(self.api_base, headers=headers, json=payload)
+            response = self._session.post(self.api_base, headers=headers, json=payload)
             response.raise_for_status()
             result = response.json()
             
             # 解析模型返回的JSON响应
             feedback_str = result['choices'][0]['message']['content']
-            feedback_dict = eval(feedback_str)  # 注意：实际使用时应该用json.loads并添加错误处理
+            match = _JSON_RE.search(feedback_str)
+            if match is None:
+                raise ValueError(f"No JSON object in model response: {feedback_str!r}")
+            feedback_dict = _json_loads(match.group(0))
+            sectors = self._quantize_sectors(feedback_dict['sectors'])
             
-            return feedback_dict['sectors']
+            if cache_key is not None:
+                with self._feedback_lock:
+                    self._feedback_cache[cache_key] = sectors
+                    if len(self._feedback_cache) > self.feedback_cache_size:
+                        self._feedback_cache.popitem(last=False)
+            return sectors
             
         except Exception as e:
             print(f"Error getting model feedback: {e}")
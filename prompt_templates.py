@@ -1,6 +1,7 @@
 # prompt_templates.py
 from typing import Dict, List, Tuple
 import json
+import numpy as np
 
 class PromptTemplate:
     def __init__(self):
@@ -69,6 +70,12 @@ class PromptTemplate:
             """
         }
         
+        # 按障碍物列表缓存的描述片段和坐标数组
+        self._obstacles = None
+        self._obs_prefix: List[str] = []
+        self._obs_suffix: List[str] = []
+        self._obs_np = np.empty((0, 3))
+        
         self.format_requirements = """
         请以JSON格式返回建议:
         {
@@ -92,16 +99,23 @@ class PromptTemplate:
                                   obstacles: List[Tuple[float, float, float]],
                                   current_pos: Tuple[float, float]) -> str:
         """格式化障碍物描述"""
-        descriptions = []
-        for ox, oy, r in obstacles:
-            dist = ((ox - current_pos[0])**2 + (oy - current_pos[1])**2)**0.5
-            angle = np.degrees(np.arctan2(oy - current_pos[1], 
-                                        ox - current_pos[0]))
-            descriptions.append(
-                f"- 障碍物位于 ({ox:.2f}, {oy:.2f}), "
-                f"距离 {dist:.2f}, 方向 {angle:.1f}度, 半径 {r:.2f}"
-            )
-        return "\n".join(descriptions)
+        # 障碍物的位置和半径不变，只在列表变化时重新格式化
+        if obstacles is not self._obstacles:
+            self._obstacles = obstacles
+            self._obs_np = np.asarray(obstacles, dtype=np.float64).reshape(-1, 3)
+            self._obs_prefix = [f"- 障碍物位于 ({ox:.2f}, {oy:.2f}), "
+                                for ox, oy, _ in self._obs_np]
+            self._obs_suffix = [f"度, 半径 {r:.2f}" for r in self._obs_np[:, 2]]
+        
+        # 距离和方向随当前位置变化，向量化计算
+        dx = self._obs_np[:, 0] - current_pos[0]
+        dy = self._obs_np[:, 1] - current_pos[1]
+        dists = np.hypot(dx, dy)
+        angles = np.degrees(np.arctan2(dy, dx))
+        return "\n".join(
+            f"{prefix}距离 {dist:.2f}, 方向 {angle:.1f}{suffix}"
+            for prefix, dist, angle, suffix in zip(
+                self._obs_prefix, dists, angles, self._obs_suffix))
     
     def create_prompt(self, 
                      current_pos: Tuple[float, float],
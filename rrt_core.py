@@ -0,0 +1,257 @@
+# rrt_core.py
+import hashlib
+import os
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # 未安装numba时以纯Python方式运行
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+def kernel_version() -> int:
+    """由本文件和rrt_core_aot.py内容计算的内核版本号
+
+    预编译模块在构建时记录该值，导入时不一致说明模块已过期。
+    """
+    digest = hashlib.sha1()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in ('rrt_core.py', 'rrt_core_aot.py'):
+        with open(os.path.join(here, name), 'rb') as f:
+            digest.update(f.read())
+    return int(digest.hexdigest()[:15], 16)
+
+
+# 距离初值为inf，fastmath的ninf假设会使与inf的比较结果未定义，故不启用
+@njit(cache=True)
+def nearest_idx(xs, ys, n, px, py):
+    """返回前n个节点中距离(px, py)最近的节点索引"""
+    best = 0
+    best_dist = np.inf
+    for i in range(n):
+        dx = xs[i] - px
+        dy = ys[i] - py
+        dist = dx * dx + dy * dy
+        if dist < best_dist:
+            best_dist = dist
+            best = i
+    return best
+
+
+# 节点数少于该值时直接线性扫描
+GRID_MIN_NODES = 64
+
+
+@njit(cache=True)
+def grid_cell(x, y, bminx, bminy, cell, nx, ny):
+    """返回点所在网格单元的(列, 行)，越界时截断到边缘单元"""
+    cx = min(max(int((x - bminx) / cell), 0), nx - 1)
+    cy = min(max(int((y - bminy) / cell), 0), ny - 1)
+    return cx, cy
+
+
+@njit(cache=True)
+def grid_insert(cell_head, cell_next, idx, x, y, bminx, bminy, cell, nx, ny):
+    """把节点idx插入其所在单元的链表头部"""
+    cx, cy = grid_cell(x, y, bminx, bminy, cell, nx, ny)
+    c = cy * nx + cx
+    cell_next[idx] = cell_head[c]
+    cell_head[c] = idx
+
+
+@njit(cache=True)  # 同nearest_idx，best_dist以inf开始，不能启用fastmath
+def grid_nearest_idx(xs, ys, n, px, py, cell_head, cell_next,
+                     bminx, bminy, cell, nx, ny):
+    """借助均匀网格查找最近节点
+
+    从查询点所在单元开始逐圈向外搜索，当已找到的最近距离不超过
+    未搜索圈的距离下界时停止；访问的单元数超过节点数时退化为线性扫描。
+    """
+    if n < GRID_MIN_NODES:
+        return nearest_idx(xs, ys, n, px, py)
+    qx, qy = grid_cell(px, py, bminx, bminy, cell, nx, ny)
+    best = -1
+    best_dist = np.inf
+    visited = 0
+    for r in range(max(nx, ny)):
+        for cy in range(qy - r, qy + r + 1):
+            if cy < 0 or cy >= ny:
+                continue
+            # 上下边只需遍历整行，中间行只取左右两端单元
+            edge_row = r == 0 or cy == qy - r or cy == qy + r
+            cx = qx - r
+            while cx <= qx + r:
+                if 0 <= cx < nx:
+                    i = cell_head[cy * nx + cx]
+                    while i != -1:
+                        dx = xs[i] - px
+                        dy = ys[i] - py
+                        dist = dx * dx + dy * dy
+                        if dist < best_dist:
+                            best_dist = dist
+                            best = i
+                        i = cell_next[i]
+                    visited += 1
+                cx += 1 if edge_row else 2 * r
+        # 第r圈之外的节点距离至少为r个单元
+        if best != -1 and best_dist <= (r * cell) ** 2:
+            return best
+        if visited > n:
+            return nearest_idx(xs, ys, n, px, py)
+    if best == -1:
+        return nearest_idx(xs, ys, n, px, py)
+    return best
+
+
+@njit(cache=True, fastmath=True)
+def collision_free(x1, y1, x2, y2, obs):
+    """检查线段是否与障碍物(obs为(K, 3)数组)相交"""
+    dx = x2 - x1
+    dy = y2 - y1
+    seg_len2 = dx * dx + dy * dy
+    for k in range(obs.shape[0]):
+        ox = obs[k, 0]
+        oy = obs[k, 1]
+        r = obs[k, 2]
+        # 障碍物圆心在线段上的投影参数，截断到[0, 1]得到最近点
+        t = 0.0
+        if seg_len2 > 0.0:
+            t = ((ox - x1) * dx + (oy - y1) * dy) / seg_len2
+            t = min(max(t, 0.0), 1.0)
+        px = x1 + t * dx - ox
+        py = y1 + t * dy - oy
+        if px * px + py * py <= r * r:
+            return False
+    return True
+
+
+# 每个扇区预先计算的方向查找表长度
+SECTOR_LUT_SIZE = 1024
+
+# 扇区采样的最大重试次数；节点位于边界且扇区完全朝外时采样永远不会
+# 落在边界内，超过该次数后改为全局均匀采样
+SAMPLE_MAX_TRIES = 64
+
+
+def build_sector_lut(centers, half_spans, size=SECTOR_LUT_SIZE):
+    """为每个扇区预先计算张角范围内均匀分布的(cos, sin)查找表(角度为弧度)
+
+    返回两个形状为(扇区数, size)的数组。
+    """
+    offsets = np.linspace(-1.0, 1.0, size)
+    thetas = centers[:, None] + half_spans[:, None] * offsets[None, :]
+    return np.cos(thetas), np.sin(thetas)
+
+
+@njit(cache=True)
+def sample_in_sector(cx, cy, cos_lut, sin_lut, step, bminx, bminy, bmaxx, bmaxy):
+    """以(cx, cy)为圆心在扇形区域内采样，直到落在边界内
+
+    方向从扇区的(cos, sin)查找表中随机选取，避免每次计算三角函数。
+    重试SAMPLE_MAX_TRIES次仍在边界外时返回边界内的全局均匀采样点。
+    """
+    for _ in range(SAMPLE_MAX_TRIES):
+        distance = np.random.uniform(0.0, step)
+        k = np.random.randint(0, cos_lut.shape[0])
+        x = cx + distance * cos_lut[k]
+        y = cy + distance * sin_lut[k]
+        if bminx <= x <= bmaxx and bminy <= y <= bmaxy:
+            return x, y
+    return np.random.uniform(bminx, bmaxx), np.random.uniform(bminy, bmaxy)
+
+
+@njit(cache=True)
+def sample_batch(cx, cy, cos_lut, sin_lut, step,
+                 bminx, bminy, bmaxx, bmaxy, out_x, out_y):
+    """在扇形区域内一次采样len(out_x)个候选点，写入out_x/out_y"""
+    for j in range(out_x.shape[0]):
+        out_x[j], out_y[j] = sample_in_sector(cx, cy, cos_lut, sin_lut, step,
+                                              bminx, bminy, bmaxx, bmaxy)
+
+
+@njit(cache=True)
+def choose_sector(cumw):
+    """按优先级加权随机选择一个扇区，cumw为优先级的累积和"""
+    r = np.random.random() * cumw[-1]
+    k = np.searchsorted(cumw, r, side='right')
+    return min(k, cumw.shape[0] - 1)
+
+
+@njit(cache=True)
+def path_indices(parent_ids, last):
+    """沿父节点索引从last回溯到根节点，返回从根到last的索引数组"""
+    length = 0
+    i = last
+    while i != -1:
+        length += 1
+        i = parent_ids[i]
+    path = np.empty(length, dtype=np.int64)
+    i = last
+    for k in range(length - 1, -1, -1):
+        path[k] = i
+        i = parent_ids[i]
+    return path
+
+
+@njit(cache=True)
+def batch_expand(xs, ys, parent_ids, n, obs,
+                 sector_cos, sector_sin, sector_cumw, step,
+                 bminx, bminy, bmaxx, bmaxy, gx, gy, n_iters, n_candidates,
+                 cell_head, cell_next, cell, nx, ny):
+    """连续执行n_iters次RRT扩展
+
+    有扇区配置时每次迭代在选中扇区内采样n_candidates个候选点，
+    接受第一个可无碰撞连接到其最近节点的候选点。
+    返回 (节点数, 是否到达目标, 实际迭代次数)。到达目标时目标节点
+    已作为最后一个节点写入。
+    """
+    cand_x = np.empty(n_candidates)
+    cand_y = np.empty(n_candidates)
+    for it in range(n_iters):
+        accepted = False
+        px = 0.0
+        py = 0.0
+        nearest = 0
+        if sector_cumw.shape[0] > 0:
+            k = choose_sector(sector_cumw)
+            sample_batch(xs[n - 1], ys[n - 1], sector_cos[k], sector_sin[k], step,
+                         bminx, bminy, bmaxx, bmaxy, cand_x, cand_y)
+            for j in range(n_candidates):
+                nearest = grid_nearest_idx(xs, ys, n, cand_x[j], cand_y[j],
+                                           cell_head, cell_next,
+                                           bminx, bminy, cell, nx, ny)
+                if collision_free(xs[nearest], ys[nearest],
+                                  cand_x[j], cand_y[j], obs):
+                    px = cand_x[j]
+                    py = cand_y[j]
+                    accepted = True
+                    break
+        else:
+            # 没有扇区配置时进行全局采样
+            px = np.random.uniform(bminx, bmaxx)
+            py = np.random.uniform(bminy, bmaxy)
+            nearest = grid_nearest_idx(xs, ys, n, px, py, cell_head, cell_next,
+                                       bminx, bminy, cell, nx, ny)
+            accepted = collision_free(xs[nearest], ys[nearest], px, py, obs)
+
+        if accepted:
+            xs[n] = px
+            ys[n] = py
+            parent_ids[n] = nearest
+            grid_insert(cell_head, cell_next, n, px, py,
+                        bminx, bminy, cell, nx, ny)
+            n += 1
+
+            if collision_free(px, py, gx, gy, obs):
+                xs[n] = gx
+                ys[n] = gy
+                parent_ids[n] = n - 1
+                grid_insert(cell_head, cell_next, n, gx, gy,
+                            bminx, bminy, cell, nx, ny)
+                n += 1
+                return n, True, it + 1
+    return n, False, n_iters
@@ -0,0 +1,52 @@
+# rrt_core_aot.py
+"""预编译rrt_core中的内核，避免每次启动解释器时的JIT编译开销
+
+构建: python rrt_core_aot.py
+生成的扩展模块 _rrt_core_aot 与本文件位于同一目录，rrt_planner在导入时
+优先使用它，未构建时回退到rrt_core的JIT版本。修改rrt_core.py或本文件后
+需要重新构建，否则版本号不一致，rrt_planner会忽略过期的模块。
+"""
+import os
+
+from numba.pycc import CC
+
+import rrt_core
+
+cc = CC('_rrt_core_aot')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+# 构建时的内核版本号，编译为常量
+KERNEL_VERSION = rrt_core.kernel_version()
+
+
+@cc.export('kernel_version', 'i8()')
+def kernel_version():
+    return KERNEL_VERSION
+
+
+cc.export('nearest_idx', 'i8(f4[:], f4[:], i8, f8, f8)')(
+    rrt_core.nearest_idx.py_func)
+cc.export('grid_insert',
+          'void(i4[:], i4[:], i8, f8, f8, f8, f8, f8, i8, i8)')(
+    rrt_core.grid_insert.py_func)
+cc.export('grid_nearest_idx',
+          'i8(f4[:], f4[:], i8, f8, f8, i4[:], i4[:], f8, f8, f8, i8, i8)')(
+    rrt_core.grid_nearest_idx.py_func)
+cc.export('collision_free', 'b1(f8, f8, f8, f8, f4[:, :])')(
+    rrt_core.collision_free.py_func)
+cc.export('sample_in_sector',
+          'UniTuple(f8, 2)(f8, f8, f8[:], f8[:], f8, f8, f8, f8, f8)')(
+    rrt_core.sample_in_sector.py_func)
+cc.export('sample_batch',
+          'void(f8, f8, f8[:], f8[:], f8, f8, f8, f8, f8, f8[:], f8[:])')(
+    rrt_core.sample_batch.py_func)
+cc.export('path_indices', 'i8[:](i4[:], i8)')(
+    rrt_core.path_indices.py_func)
+cc.export('batch_expand',
+          'Tuple((i8, b1, i8))(f4[:], f4[:], i4[:], i8, f4[:, :], '
+          'f8[:, :], f8[:, :], f8[:], f8, f8, f8, f8, f8, f8, f8, i8, i8, '
+          'i4[:], i4[:], f8, i8, i8)')(
+    rrt_core.batch_expand.py_func)
+
+if __name__ == "__main__":
+    cc.compile()
@@ -2,6 +2,18 @@
 import numpy as np
 from typing import List, Tuple, Optional
 from dataclasses import dataclass
+from concurrent.futures import Future
+
+import rrt_core
+
+# 预编译内核由 python rrt_core_aot.py 构建；未构建或版本与当前源码
+# 不一致(修改rrt_core后未重新构建)时使用JIT版本
+try:
+    import _rrt_core_aot as kernels
+    if kernels.kernel_version() != rrt_core.kernel_version():
+        kernels = rrt_core
+except ImportError:
+    kernels = rrt_core
 
 @dataclass
 class Node:
@@ -11,8 +23,8 @@ class Node:
 
 @dataclass
 class SectorConfig:
-    center_angle: float  # 扇形中心角度
-    span_angle: float   # 扇形张角
+    center_angle: float  # 扇形中心角度(度)
+    span_angle: float   # 扇形张角(度)
     priority: float     # 优先级 (0-1)
 
 class ImprovedRRT:
@@ -20,104 +32,192 @@ class ImprovedRRT:
                  bounds: Tuple[float, float, float, float],
                  obstacles: List[Tuple[float, float, float]],  # (x, y, radius)
                  step_size: float = 0.5,
-                 max_iterations: int = 5000):
+                 max_iterations: int = 5000,
+                 batch_size: int = 50,
+                 n_candidates: int = 16,
+                 vlm_every: int = 20,
+                 stall_iterations: int = 200):
         self.start = Node(*start)
         self.goal = Node(*goal)
         self.bounds = bounds
         self.obstacles = obstacles
+        # 连续的(K, 3)数组，保证编译内核总是使用同一种C连续签名；
+        # 几何计算只需约1e-2的精度，节点和障碍物均以float32存储
+        self.obstacles_np = np.ascontiguousarray(
+            np.asarray(obstacles, dtype=np.float32).reshape(-1, 3))
         self.step_size = step_size
         self.max_iterations = max_iterations
+        self.batch_size = batch_size  # 每次调用编译内核执行的扩展迭代次数
+        self.n_candidates = n_candidates  # 扇区采样时每次迭代的候选点数
+        self.vlm_every = vlm_every  # 请求多模态反馈的迭代间隔
+        self.stall_iterations = stall_iterations  # 连续多少次迭代无新节点视为停滞
         
-        self.nodes: List[Node] = [self.start]
-        self.current_sectors: List[SectorConfig] = []
+        # 节点以SoA形式存储在预分配数组中，父节点索引-1表示根节点
+        capacity = max_iterations + 2
+        self._xs = np.empty(capacity, dtype=np.float32)
+        self._ys = np.empty(capacity, dtype=np.float32)
+        self._parent_ids = np.full(capacity, -1, dtype=np.int32)
+        self._n = 0
+        
+        # 最近邻查询用的均匀网格，每个单元以链表保存节点索引；单元边长
+        # 不小于步长，且单元数不超过节点容量，避免大地图小步长时网格过大
+        area = (bounds[2] - bounds[0]) * (bounds[3] - bounds[1])
+        self._cell = max(step_size, float(np.sqrt(area / capacity)))
+        self._grid_nx = int(np.ceil((bounds[2] - bounds[0]) / self._cell)) + 1
+        self._grid_ny = int(np.ceil((bounds[3] - bounds[1]) / self._cell)) + 1
+        self._cell_head = np.full(self._grid_nx * self._grid_ny, -1, dtype=np.int32)
+        self._cell_next = np.full(capacity, -1, dtype=np.int32)
+        self._grid_params = (bounds[0], bounds[1], self._cell,
+                             self._grid_nx, self._grid_ny)
+        self._append_node(self.start.x, self.start.y, -1)
+        self.update_sectors([])
+    
+    def _append_node(self, x: float, y: float, parent_id: int) -> int:
+        """追加节点并返回其索引"""
+        idx = self._n
+        self._xs[idx] = x
+        self._ys[idx] = y
+        self._parent_ids[idx] = parent_id
+        kernels.grid_insert(self._cell_head, self._cell_next, idx, x, y,
+                             *self._grid_params)
+        self._n += 1
+        return idx
+    
+    def get_node(self, idx: int) -> Node:
+        """按索引构造节点视图"""
+        parent_id = int(self._parent_ids[idx])
+        return Node(float(self._xs[idx]), float(self._ys[idx]),
+                    parent_id if parent_id >= 0 else None)
+    
+    def node_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """返回已探索节点的坐标和父节点索引数组(只读视图)"""
+        n = self._n
+        return self._xs[:n], self._ys[:n], self._parent_ids[:n]
+    
+    @property
+    def nodes(self) -> List[Node]:
+        """所有已探索节点（供外部绘图/反馈使用）"""
+        return [self.get_node(i) for i in range(self._n)]
         
     def sample_in_sector(self, sector: SectorConfig) -> Tuple[float, float]:
         """在给定扇形区域内采样"""
-        while True:
-            # 随机采样距离和角度
+        # 单次采样直接计算三角函数，查找表只在批量扩展中使用；扇区角度以度为单位
+        cx = float(self._xs[self._n - 1])
+        cy = float(self._ys[self._n - 1])
+        base_angle = np.radians(sector.center_angle)
+        angle_range = np.radians(sector.span_angle) / 2
+        for _ in range(rrt_core.SAMPLE_MAX_TRIES):
             distance = np.random.uniform(0, self.step_size)
-            base_angle = sector.center_angle
-            angle_range = sector.span_angle / 2
             angle = base_angle + np.random.uniform(-angle_range, angle_range)
-            
-            # 计算采样点坐标
-            x = self.nodes[-1].x + distance * np.cos(angle)
-            y = self.nodes[-1].y + distance * np.sin(angle)
-            
-            # 检查是否在边界内
-            if (self.bounds[0] <= x <= self.bounds[2] and 
-                self.bounds[1] <= y <= self.bounds[3]):
+            x = cx + distance * np.cos(angle)
+            y = cy + distance * np.sin(angle)
+            if (self.bounds[0] <= x <= self.bounds[2] and
+                    self.bounds[1] <= y <= self.bounds[3]):
                 return x, y
+        # 扇区完全指向边界外时退化为全局均匀采样
+        return (np.random.uniform(self.bounds[0], self.bounds[2]),
+                np.random.uniform(self.bounds[1], self.bounds[3]))
     
     def is_collision_free(self, x1: float, y1: float, x2: float, y2: float) -> bool:
         """检查路径是否无碰撞"""
-        for ox, oy, r in self.obstacles:
-            # 简化的碰撞检测：检查路径上的几个点是否与障碍物相交
-            t = np.linspace(0, 1, 10)
-            path_x = x1 + (x2 - x1) * t
-            path_y = y1 + (y2 - y1) * t
-            
-            for px, py in zip(path_x, path_y):
-                if np.sqrt((px - ox)**2 + (py - oy)**2) <= r:
-                    return False
-        return True
+        return kernels.collision_free(x1, y1, x2, y2, self.obstacles_np)
     
     def find_nearest_node(self, point: Tuple[float, float]) -> Node:
         """找到最近的节点"""
-        distances = [(node.x - point[0])**2 + (node.y - point[1])**2 
-                    for node in self.nodes]
-        return self.nodes[np.argmin(distances)]
+        return self.get_node(self.find_nearest_idx(point))
+    
+    def find_nearest_idx(self, point: Tuple[float, float]) -> int:
+        """找到最近节点的索引"""
+        return int(kernels.grid_nearest_idx(
+            self._xs, self._ys, self._n, point[0], point[1],
+            self._cell_head, self._cell_next, *self._grid_params))
     
     def update_sectors(self, sectors: List[SectorConfig]):
         """更新采样扇区配置"""
         self.current_sectors = sectors
+        # 扇区角度以度为单位（与模型输出和可视化一致），查找表需要弧度
+        centers = np.radians(np.array([s.center_angle for s in sectors],
+                                      dtype=np.float64))
+        half_spans = np.radians(np.array([s.span_angle / 2 for s in sectors],
+                                         dtype=np.float64))
+        self._sector_cos, self._sector_sin = rrt_core.build_sector_lut(
+            centers, half_spans)
+        self._sector_cumw = np.cumsum([s.priority for s in sectors],
+                                      dtype=np.float64)
     
     def plan(self, multimodal_feedback) -> Optional[List[Node]]:
-        """执行路径规划"""
-        for i in range(self.max_iterations):
-            # 根据当前扇区配置选择一个扇区进行采样
-            if self.current_sectors:
-                weights = [s.priority for s in self.current_sectors]
-                chosen_sector = np.random.choice(self.current_sectors, p=weights/np.sum(weights))
-                sampled_point = self.sample_in_sector(chosen_sector)
-            else:
-                # 如果没有扇区配置，进行全局采样
-                sampled_point = (
-                    np.random.uniform(self.bounds[0], self.bounds[2]),
-                    np.random.uniform(self.bounds[1], self.bounds[3])
-                )
+        """执行路径规划
+        
+        multimodal_feedback以(节点, 目标, 障碍物, 是否停滞)调用，可以直接
+        返回扇区列表，也可以返回Future；后者在结果返回前继续使用当前扇区
+        扩展，返回后再切换。停滞时查询节点与上一次相同，回调应避免复用
+        上一次的建议。
+        """
+        # 起点可直接连到目标时无需搜索
+        if self.is_collision_free(self.start.x, self.start.y,
+                                  self.goal.x, self.goal.y):
+            self.goal.parent_id = 0
+            self._append_node(self.goal.x, self.goal.y, 0)
+            return self.extract_path()
+        
+        pending: Optional[Future] = None
+        queried_n = self._n  # 上次请求反馈时的节点数
+        since_feedback = 0  # 距上次请求反馈的迭代次数
+        since_new_node = 0  # 连续未接受新节点的迭代次数
+        i = 0
+        while i < self.max_iterations:
+            # 在编译内核中批量扩展，期间沿用当前扇区配置；
+            # 没有进行中的请求时，批次在下一次反馈到期处截断
+            n_iters = min(self.batch_size, self.max_iterations - i)
+            if pending is None and since_feedback < self.vlm_every:
+                n_iters = min(n_iters, self.vlm_every - since_feedback)
+            prev_n = self._n
+            self._n, reached, used = kernels.batch_expand(
+                self._xs, self._ys, self._parent_ids, self._n, self.obstacles_np,
+                self._sector_cos, self._sector_sin,
+                self._sector_cumw, self.step_size,
+                *self.bounds, self.goal.x, self.goal.y,
+                n_iters, self.n_candidates, self._cell_head, self._cell_next,
+                self._cell, self._grid_nx, self._grid_ny)
+            i += used
+            since_feedback += used
+            since_new_node = 0 if self._n > prev_n else since_new_node + used
+            
+            if reached:
+                if pending is not None:
+                    pending.cancel()
+                self.goal.parent_id = int(self._parent_ids[self._n - 1])
+                return self.extract_path()
             
-            # 找到最近节点
-            nearest_node = self.find_nearest_node(sampled_point)
+            # 后台反馈完成后切换到新的扇区配置
+            if pending is not None and pending.done():
+                self.update_sectors(pending.result())
+                pending = None
             
-            # 检查新节点是否可达
-            if self.is_collision_free(nearest_node.x, nearest_node.y,
-                                    sampled_point[0], sampled_point[1]):
-                new_node = Node(sampled_point[0], sampled_point[1], 
-                              len(self.nodes) - 1)
-                self.nodes.append(new_node)
-                
-                # 检查是否可以连接到目标
-                if self.is_collision_free(new_node.x, new_node.y,
-                                        self.goal.x, self.goal.y):
-                    self.goal.parent_id = len(self.nodes) - 1
-                    self.nodes.append(self.goal)
-                    return self.extract_path()
-                
-                # 获取多模态模型反馈并更新扇区
-                feedback = multimodal_feedback(new_node, self.goal, self.obstacles)
-                self.update_sectors(feedback)
+            # 每vlm_every次迭代或扩展停滞时获取多模态模型反馈并更新扇区
+            due = since_feedback >= self.vlm_every and self._n > queried_n
+            stalled = since_new_node >= self.stall_iterations
+            if pending is None and (due or stalled):
+                new_node = self.get_node(self._n - 1)
+                feedback = multimodal_feedback(new_node, self.goal, self.obstacles,
+                                               stalled)
+                if isinstance(feedback, Future):
+                    # 命中反馈缓存时Future已完成，立即切换扇区
+                    if feedback.done():
+                        self.update_sectors(feedback.result())
+                    else:
+                        pending = feedback
+                else:
+                    self.update_sectors(feedback)
+                queried_n = self._n
+                since_feedback = 0
+                since_new_node = 0
         
+        if pending is not None:
+            pending.cancel()
         return None
     
     def extract_path(self) -> List[Node]:
         """提取最终路径"""
-        path = []
-        current_node = self.nodes[-1]  # 目标节点
-        
-        while current_node.parent_id is not None:
-            path.append(current_node)
-            current_node = self.nodes[current_node.parent_id]
-        
-        path.append(self.start)
-        return path[::-1]
\ No newline at end of file
+        path = kernels.path_indices(self._parent_ids, self._n - 1)  # 从目标节点回溯
+        return [self.get_node(i) for i in path]
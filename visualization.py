@@ -1,6 +1,7 @@
 # visualization.py
 import matplotlib.pyplot as plt
 import numpy as np
+from matplotlib.collections import LineCollection
 from matplotlib.patches import Circle, Wedge
 from typing import List, Tuple
 from rrt_planner import Node, SectorConfig
@@ -11,12 +12,15 @@ class Visualizer:
         self.fig, self.ax = plt.subplots(figsize=(10, 10))
         self.sector_patches = []
         
-    def setup_plot(self):
-        """设置基础绘图环境"""
+    def setup_plot(self, show: bool = True):
+        """设置基础绘图环境，show为True时立即以非阻塞方式显示窗口"""
         self.ax.set_xlim(self.bounds[0], self.bounds[2])
         self.ax.set_ylim(self.bounds[1], self.bounds[3])
         self.ax.grid(True)
         self.ax.set_aspect('equal')
+        # update()只刷新画布，窗口需要在这里先显示出来
+        if show:
+            self.fig.show()
         
     def draw_obstacles(self, obstacles: List[Tuple[float, float, float]]):
         """绘制障碍物"""
@@ -24,19 +28,18 @@ class Visualizer:
             obstacle = Circle((ox, oy), r, fill=True, color='red', alpha=0.3)
             self.ax.add_patch(obstacle)
             
-    def draw_nodes(self, nodes: List[Node]):
-        """绘制RRT树节点和边"""
-        # 绘制节点之间的连接
-        for node in nodes[1:]:  # 跳过起始节点
-            if node.parent_id is not None:
-                parent = nodes[node.parent_id]
-                self.ax.plot([parent.x, node.x], [parent.y, node.y], 
-                           'g-', alpha=0.5, linewidth=0.5)
+    def draw_nodes(self, xs: np.ndarray, ys: np.ndarray, parent_ids: np.ndarray):
+        """绘制RRT树节点和边（参数为ImprovedRRT.node_arrays()的返回值）"""
+        # 所有节点之间的连接合并为一个LineCollection绘制
+        child = np.flatnonzero(parent_ids >= 0)
+        parent = parent_ids[child]
+        segs = np.stack([np.column_stack([xs[parent], ys[parent]]),
+                         np.column_stack([xs[child], ys[child]])], axis=1)
+        self.ax.add_collection(
+            LineCollection(segs, colors='g', alpha=0.5, linewidth=0.5))
         
         # 绘制所有节点
-        node_x = [node.x for node in nodes]
-        node_y = [node.y for node in nodes]
-        self.ax.plot(node_x, node_y, 'g.', markersize=2)
+        self.ax.plot(xs, ys, 'g.', markersize=2)
         
     def draw_path(self, path: List[Node]):
         """绘制最终路径"""
@@ -72,15 +75,15 @@ class Visualizer:
         self.ax.legend()
         
     def update(self):
-        """更新显示"""
-        self.fig.canvas.draw()
-        plt.pause(0.01)
+        """更新显示（不阻塞，只处理待绘制内容和界面事件）"""
+        self.fig.canvas.draw_idle()
+        self.fig.canvas.flush_events()
         
     def save(self, filename: str):
         """保存图像"""
-        plt.savefig(filename)
+        self.fig.savefig(filename)
         
     def clear(self):
         """清除当前图像"""
         self.ax.clear()
-        self.setup_plot()
\ No newline at end of file
+        self.setup_plot(show=False)
\ No newline at end of file